@@ -301,7 +301,7 @@ async def after_agent_callback(callback_context):
             artifact_name = f"{safe_title}_{timestamp}.png"
             
             version = await callback_context.save_artifact(artifact_name, image_part)
-            logger.info(f"✅ Saved chart as artifact '{artifact_name}' version {version}")
+            logger.info("✅ Saved chart as artifact '%s' version %s", artifact_name, version)
             
             # Store artifact info in state
             state["last_artifact"] = artifact_name
@@ -326,9 +326,9 @@ async def after_agent_callback(callback_context):
         
     except Exception as e:
         logger = logging.getLogger(__name__)
-        logger.error(f"❌ Error in after agent callback: {e}")
+        logger.error("❌ Error in after agent callback: %s", e)
         import traceback
-        logger.error(f"Callback traceback: {traceback.format_exc()}")
+        logger.error("Callback traceback: %s", traceback.format_exc())
         return None
 
 handling_agent = Agent(
@@ -17,6 +17,7 @@ from google.adk.tools import google_search, AgentTool  # Import the tool
 from google.adk.agents.remote_a2a_agent import AGENT_CARD_WELL_KNOWN_PATH
 from google.adk.agents.remote_a2a_agent import RemoteA2aAgent
 import logging
+import random
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +37,21 @@ class Config:
 
 config = Config()
 
+_WEATHER_CONDITIONS = (
+    "Sunny",
+    "Partly Cloudy",
+    "Cloudy",
+    "Rainy",
+    "Thunderstorms",
+    "Snowy",
+    "Windy",
+    "Foggy",
+)
+_TEMPERATURES = tuple(range(20, 105))
+_HUMIDITY_LEVELS = tuple(range(10, 100))
+_WIND_SPEEDS = tuple(range(0, 30))
+_RNG = random.Random()
+
 
 def get_weather(city: str, state: str) -> dict:
     """
@@ -48,31 +64,15 @@ def get_weather(city: str, state: str) -> dict:
     Returns:
         A dictionary containing weather information
     """
-    import random
-
-    weather_conditions = [
-        "Sunny",
-        "Partly Cloudy",
-        "Cloudy",
-        "Rainy",
-        "Thunderstorms",
-        "Snowy",
-        "Windy",
-        "Foggy",
-    ]
-    temperatures = range(20, 105)
-    humidity_levels = range(10, 100)
-    wind_speeds = range(0, 30)
-
     weather = {
         "location": f"{city}, {state}",
-        "condition": random.choice(weather_conditions),
-        "temperature": random.choice(temperatures),
-        "humidity": random.choice(humidity_levels),
-        "wind_speed": random.choice(wind_speeds),
+        "condition": _RNG.choice(_WEATHER_CONDITIONS),
+        "temperature": _RNG.choice(_TEMPERATURES),
+        "humidity": _RNG.choice(_HUMIDITY_LEVELS),
+        "wind_speed": _RNG.choice(_WIND_SPEEDS),
     }
 
-    logger.info(f"Weather for {city}, {state}: {weather}")
+    logger.info("Weather for %s, %s: %s", city, state, weather)
 
     return weather
 
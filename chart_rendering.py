@@ -0,0 +1,134 @@
+"""
+Chart rendering shared by main.py's /api/generate-chart and chart_service.py.
+Runs inside ProcessPoolExecutor workers, so this module must stay importable
+without pulling in the FastAPI app or the agents.
+"""
+
+import hashlib
+import io
+import os
+import queue
+import threading
+import orjson
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+STATIC_IMAGES_DIR = os.path.join(os.path.dirname(__file__), "static", "images")
+
+# Part of every chart key. Bump it whenever rendering output changes, so
+# charts already on disk (and cached by clients as immutable) are not reused.
+CHART_RENDERER_VERSION = 2
+
+# Figures are pooled and cleared between chart requests instead of being
+# created and torn down each time. They are plain Figure objects on their
+# own Agg canvas, so no pyplot global state is involved; Agg rendering is
+# still not thread-safe, so every use of a pooled figure holds _FIG_LOCK.
+_FIG_POOL = queue.LifoQueue()
+_FIG_LOCK = threading.Lock()
+
+def _get_fig():
+    try:
+        fig = _FIG_POOL.get_nowait()
+    except queue.Empty:
+        fig = Figure(figsize=(12, 8), dpi=150)
+        FigureCanvasAgg(fig)
+    # A fixed layout replaces tight_layout()/bbox_inches='tight', which each
+    # cost an extra draw pass per save. clf() resets margins, so set them here.
+    fig.subplots_adjust(left=0.1, right=0.95, top=0.9, bottom=0.12)
+    return fig
+
+def _return_fig(fig):
+    fig.clf()
+    _FIG_POOL.put(fig)
+
+def warm_up():
+    """
+    Pay matplotlib's one-time costs (font cache, Agg canvas, PNG encoder)
+    up front by rendering a throwaway chart with a pooled figure.
+    """
+    with _FIG_LOCK:
+        fig = _get_fig()
+        try:
+            ax = fig.add_subplot(111)
+            ax.plot([0, 1], [0, 1], marker='o')
+            ax.set_title("warm-up", fontsize=18, fontweight='bold')
+            fig.canvas.print_png(io.BytesIO())
+        finally:
+            _return_fig(fig)
+
+def init_worker():
+    """ProcessPoolExecutor initializer: warm matplotlib in each worker."""
+    warm_up()
+
+def chart_key(chart_request: dict) -> str:
+    """Stable hash of a chart request; identical requests render identical charts."""
+    canonical = orjson.dumps(
+        [CHART_RENDERER_VERSION, chart_request], option=orjson.OPT_SORT_KEYS
+    )
+    return hashlib.blake2b(canonical).hexdigest()[:16]
+
+def render_chart(chart_request: dict, filename: str) -> bytes:
+    """
+    Render a chart request to static/images/<filename> as a PNG.
+
+    Returns:
+        The PNG bytes that were written.
+    """
+    os.makedirs(STATIC_IMAGES_DIR, exist_ok=True)
+    return render_chart_file(
+        chart_request.get("chart_type", "line_projection"),
+        chart_request.get("data", {}),
+        chart_request.get("title", "Financial Analysis"),
+        os.path.join(STATIC_IMAGES_DIR, filename),
+    )
+
+def render_chart_file(chart_type: str, chart_data: dict, title: str, filepath: str) -> bytes:
+    """Draw a line_projection or spending_pie chart, save it as a PNG at filepath and return the bytes."""
+    buffer = io.BytesIO()
+    with _FIG_LOCK:
+        fig = _get_fig()
+        try:
+            ax = fig.add_subplot(111)
+
+            # Simple chart creation based on type
+            if chart_type == "line_projection":
+                years = chart_data.get("years", [2024, 2025, 2026, 2027, 2028])
+                values = chart_data.get("values", [1000, 1200, 1400, 1600, 1800])
+                ax.plot(years, values, marker='o', linewidth=3, markersize=10)
+                ax.set_xlabel('Year', fontsize=14)
+                ax.set_ylabel('Value ($)', fontsize=14)
+            elif chart_type == "spending_pie":
+                labels = chart_data.get("labels", ["Housing", "Food", "Transport", "Entertainment"])
+                sizes = chart_data.get("sizes", [40, 25, 20, 15])
+                ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
+            else:
+                # Default fallback
+                years = [2024, 2025, 2026, 2027, 2028]
+                values = [1000, 1200, 1400, 1600, 1800]
+                ax.plot(years, values, marker='o', linewidth=3, markersize=10)
+                ax.set_xlabel('Year', fontsize=14)
+                ax.set_ylabel('Value ($)', fontsize=14)
+
+            ax.set_title(title, fontsize=18, fontweight='bold', pad=20)
+            ax.grid(True, alpha=0.3)
+
+            fig.canvas.print_png(buffer)
+        finally:
+            _return_fig(fig)
+
+    png_bytes = buffer.getvalue()
+    # Write under a per-process temp name and rename into place, so a
+    # concurrent request for the same chart never sees a half-written file.
+    tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+    _write_file(tmp_filepath, png_bytes)
+    os.replace(tmp_filepath, filepath)
+    return png_bytes
+
+def _write_file(path: str, data: bytes) -> None:
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
@@ -5,20 +5,27 @@ Runs on port 8882 to serve chart generation requests independently
 """
 
 import os
+import hashlib
+import itertools
 import json
-import re
-import matplotlib
-matplotlib.use('Agg')  # Use non-GUI backend
-import matplotlib.pyplot as plt
-from datetime import datetime
+import string
+import struct
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Union, List, Dict, Any
 import uvicorn
+from chart_rendering import STATIC_IMAGES_DIR, render_chart_file, warm_up
 
-app = FastAPI(title="Chart Generation Service", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Charts render in-process here, so warm matplotlib before serving traffic
+    warm_up()
+    yield
+
+app = FastAPI(title="Chart Generation Service", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -32,6 +39,14 @@ app.add_middleware(
 # Serve static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Strips ASCII punctuation except '-' and '_' from chart titles used in filenames
+_TITLE_PUNCTUATION = str.maketrans('', '', string.punctuation.replace('-', '').replace('_', ''))
+
+# Filename suffixes: a per-process counter hashed with a random per-process
+# personalization, so names never collide within or across server runs.
+_CHART_COUNTER = itertools.count()
+_PROCESS_NONCE = os.urandom(16)
+
 class ChartRequest(BaseModel):
     chart_data: Union[str, List[Dict[str, Any]], Dict[str, Any]]
     title: str = "Financial Analysis"
@@ -103,44 +118,20 @@ async def generate_chart(request: ChartRequest):
             chart_type = data.get("chart_type", "line_projection")
             chart_data_content = data.get("data", {})
         
-        plt.ioff()
-        fig = plt.figure(figsize=(12, 8))
-        plt.clf()
-        
-        # Simple chart creation based on type
-        if chart_type == "line_projection":
-            years = chart_data_content.get("years", [2024, 2025, 2026, 2027, 2028])
-            values = chart_data_content.get("values", [1000, 1200, 1400, 1600, 1800])
-            plt.plot(years, values, marker='o', linewidth=3, markersize=10)
-            plt.xlabel('Year', fontsize=14)
-            plt.ylabel('Value ($)', fontsize=14)
-        elif chart_type == "spending_pie":
-            labels = chart_data_content.get("labels", ["Housing", "Food", "Transport", "Entertainment"])
-            sizes = chart_data_content.get("sizes", [40, 25, 20, 15])
-            plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-        else:
-            # Default fallback
-            years = [2024, 2025, 2026, 2027, 2028]
-            values = [1000, 1200, 1400, 1600, 1800]
-            plt.plot(years, values, marker='o', linewidth=3, markersize=10)
-            plt.xlabel('Year', fontsize=14)
-            plt.ylabel('Value ($)', fontsize=14)
-        
-        plt.title(request.title, fontsize=18, fontweight='bold', pad=20)
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        
         # Save to static directory
-        safe_title = re.sub(r'[^\w\s-]', '', request.title).strip().replace(' ', '_')
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        filename = f"{safe_title}_{timestamp}.png"
+        safe_title = request.title.translate(_TITLE_PUNCTUATION).strip().replace(' ', '_')
+        suffix = hashlib.blake2b(
+            safe_title.encode(),
+            digest_size=8,
+            salt=struct.pack('<Q', next(_CHART_COUNTER)),
+            person=_PROCESS_NONCE,
+        ).hexdigest()
+        filename = f"{safe_title}_{suffix}.png"
         
-        static_dir = os.path.join(os.path.dirname(__file__), "static", "images")
-        os.makedirs(static_dir, exist_ok=True)
-        filepath = os.path.join(static_dir, filename)
+        os.makedirs(STATIC_IMAGES_DIR, exist_ok=True)
+        filepath = os.path.join(STATIC_IMAGES_DIR, filename)
         
-        plt.savefig(filepath, format='png', dpi=150, bbox_inches='tight')
-        plt.close(fig)
+        render_chart_file(chart_type, chart_data_content, request.title, filepath)
         
         image_url = f"/static/images/{filename}"
         print(f"✅ Chart generated successfully: {image_url}")
@@ -1,11 +1,21 @@
 import asyncio
+import atexit
 import logging
+import multiprocessing
+import queue
+import re
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 import matplotlib
 matplotlib.use('Agg')  # MUST be done before pyplot is imported anywhere
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-import uvicorn
+import orjson
 import os
 
 # --- Vertex AI Configuration ---
@@ -18,13 +28,61 @@ os.environ["GOOGLE_CLOUD_LOCATION"] = "us-central1"
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.adk.artifacts import InMemoryArtifactService
-from google.genai.types import Content, Part
+from google.genai.types import Content
 from agents.banking_agent.agent import root_agent
+from chart_rendering import (
+    STATIC_IMAGES_DIR,
+    chart_key,
+    init_worker as init_chart_worker,
+    render_chart,
+)
+from settings import ARTIFACT_GCS_BUCKET, SESSION_DB_URL, WEB_CONCURRENCY
 
-logging.basicConfig(level=logging.INFO)
+# Handlers only enqueue records; a background listener thread does the
+# stderr writes so logging never blocks the event loop.
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Chart rendering is CPU-bound matplotlib work, so it runs in worker
+    # processes to keep it off the event loop and out from under the GIL.
+    # "spawn" keeps the workers from inheriting the server's loop and threads.
+    # Spawned workers re-import the __main__ module, so the server must be
+    # launched via serve.py or the uvicorn CLI, never by running main.py.
+    # Split the cores between uvicorn workers so each one's chart pool
+    # doesn't oversubscribe the machine.
+    chart_workers = max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+    app.state.chart_pool = ProcessPoolExecutor(
+        max_workers=chart_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_chart_worker,
+    )
+    # Workers are started lazily; start them all now so their matplotlib
+    # warm-up happens before the first chart request rather than during it.
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(
+        *(loop.run_in_executor(app.state.chart_pool, os.getpid) for _ in range(chart_workers))
+    )
+    try:
+        yield
+    finally:
+        app.state.chart_pool.shutdown(cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# PNG bytes of recently served charts, keyed by the canonical hash of the
+# chart request (LRU).
+_CHART_BYTES = OrderedDict()
+_CHART_BYTES_MAXSIZE = 64
+
+_CHART_KEY_RE = re.compile(r'[0-9a-f]{16}')
+# A chart key always maps to the same image, so clients may cache it forever.
+_CHART_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 origins = ["http://localhost:3000"]
 app.add_middleware(
@@ -41,10 +99,20 @@ app.mount("/static", StaticFiles(directory=static_files_path), name="static")
 
 # Following the user's provided script:
 # 1. Create the session service first.
-session_service = InMemorySessionService()
+# The shared backends pull in optional dependencies (SQLAlchemy with async
+# support, google-cloud-storage), so they are only imported when configured.
+if SESSION_DB_URL:
+    from google.adk.sessions import DatabaseSessionService
+    session_service = DatabaseSessionService(db_url=SESSION_DB_URL)
+else:
+    session_service = InMemorySessionService()
 
 # 2. Create the artifact service for handling binary data like images.
-artifact_service = InMemoryArtifactService()
+if ARTIFACT_GCS_BUCKET:
+    from google.adk.artifacts import GcsArtifactService
+    artifact_service = GcsArtifactService(bucket_name=ARTIFACT_GCS_BUCKET)
+else:
+    artifact_service = InMemoryArtifactService()
 
 # 3. Create the base Runner, providing the agent, session service, and artifact service.
 runner = Runner(
@@ -60,9 +128,9 @@ async def list_sessions(app_name: str, user_id: str):
         sessions_response = await session_service.list_sessions(
             app_name=app_name, user_id=user_id
         )
-        return {"sessions": [s.model_dump() for s in sessions_response.sessions]}
+        return {"sessions": [s.model_dump(mode="json") for s in sessions_response.sessions]}
     except Exception as e:
-        logger.error(f"Error listing sessions: {e}", exc_info=True)
+        logger.error("Error listing sessions: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to list sessions")
 
 @app.post("/apps/{app_name}/users/{user_id}/sessions")
@@ -71,10 +139,10 @@ async def create_session(app_name: str, user_id: str):
         session = await session_service.create_session(
             app_name=app_name, user_id=user_id
         )
-        logger.info(f"Created new session {session.id} for user {user_id}")
-        return session.model_dump()
+        logger.info("Created new session %s for user %s", session.id, user_id)
+        return session.model_dump(mode="json")
     except Exception as e:
-        logger.error(f"Error creating session: {e}", exc_info=True)
+        logger.error("Error creating session: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to create session")
 
 @app.post("/apps/{app_name}/users/{user_id}/sessions/{session_id}:run")
@@ -82,68 +150,69 @@ async def run_agent(
     app_name: str, user_id: str, session_id: str, request: Request
 ):
     try:
-        request_data = await request.json()
+        request_data = orjson.loads(await request.body())
         new_message_dict = request_data.get("newMessage")
         
         new_message = None
         if new_message_dict and new_message_dict.get("parts"):
-            part_objects = [Part(**p) for p in new_message_dict["parts"]]
-            new_message = Content(
-                role=new_message_dict.get("role", "user"),
-                parts=part_objects
-            )
+            # One validation pass over the message, parts included. Only role and
+            # parts are taken, since Content rejects unknown keys.
+            new_message = Content.model_validate({
+                "role": new_message_dict.get("role", "user"),
+                "parts": new_message_dict["parts"],
+            })
         
-        response_events = []
-        try:
-            for event in runner.run(
-                user_id=user_id, session_id=session_id, new_message=new_message
-            ):
-                logger.info(f"Processing event: turn_complete={event.turn_complete}")
-                
-                # Manually construct a JSON-safe dictionary to avoid serialization errors
-                # with raw binary data in the event object.
-                event_dict = {
-                    "turn_complete": event.turn_complete,
-                    "interrupted": event.interrupted,
-                }
-                
-                if event.content and event.content.parts:
-                    logger.info(f"Event has {len(event.content.parts)} parts")
-                    clean_parts = []
-                    for i, part in enumerate(event.content.parts):
-                        try:
-                            # Only include parts that have actual text content.
-                            # This filters out binary metadata like 'thought_signature'.
-                            if hasattr(part, "text") and part.text is not None:
-                                clean_parts.append({"text": part.text})
-                                logger.info(f"Added text part {i}: {len(part.text)} chars")
-                        except Exception as part_error:
-                            logger.warning(f"Error processing part {i}: {part_error}")
-                            continue
+        async def stream_events():
+            # Each event is flushed as one NDJSON line as soon as the runner yields it.
+            event_count = 0
+            debug = logger.isEnabledFor(logging.DEBUG)
+            try:
+                async for event in runner.run_async(
+                    user_id=user_id, session_id=session_id, new_message=new_message
+                ):
+                    if debug:
+                        logger.debug("Processing event: turn_complete=%s", event.turn_complete)
+                    
+                    # Manually construct a JSON-safe dictionary to avoid serialization errors
+                    # with raw binary data in the event object.
+                    event_dict = {
+                        "turn_complete": event.turn_complete,
+                        "interrupted": event.interrupted,
+                    }
+                    
+                    if event.content and event.content.parts:
+                        if debug:
+                            logger.debug("Event has %d parts", len(event.content.parts))
+                        # Only include parts that have actual text content.
+                        # This filters out binary metadata like 'thought_signature'.
+                        clean_parts = [
+                            {"text": text}
+                            for part in event.content.parts
+                            if (text := getattr(part, "text", None)) is not None
+                        ]
+                        
+                        if clean_parts:
+                            event_dict["content"] = {
+                                "role": event.content.role,
+                                "parts": clean_parts
+                            }
                     
-                    if clean_parts:
-                        event_dict["content"] = {
-                            "role": event.content.role,
-                            "parts": clean_parts
-                        }
-                
-                response_events.append(event_dict)
-                logger.info(f"Added event to response: {len(response_events)} total events")
-                
-        except Exception as runner_error:
-            logger.error(f"Error in runner.run() loop: {runner_error}")
-            import traceback
-            logger.error(f"Runner traceback: {traceback.format_exc()}")
-            # Don't re-raise, try to return what we have so far
-            if response_events:
-                logger.info(f"Returning partial response with {len(response_events)} events")
+                    event_count += 1
+                    if debug:
+                        logger.debug("Streamed event: %d total events", event_count)
+                    yield orjson.dumps(event_dict) + b"\n"
+                    
+            except Exception as runner_error:
+                logger.error("Error in runner.run_async() loop: %s", runner_error)
+                logger.error("Runner traceback: %s", traceback.format_exc())
+                # Events already sent stay with the client; finish with an error frame.
+                yield orjson.dumps({"error": str(runner_error)}) + b"\n"
         
-        return response_events
+        return StreamingResponse(stream_events(), media_type="application/x-ndjson")
     except Exception as e:
-        import traceback
         error_details = traceback.format_exc()
-        logger.error(f"Error running agent: {e}")
-        logger.error(f"Full traceback: {error_details}")
+        logger.error("Error running agent: %s", e)
+        logger.error("Full traceback: %s", error_details)
         raise HTTPException(status_code=500, detail=f"Agent execution failed: {str(e)}")
 
 @app.get("/")
@@ -164,7 +233,7 @@ async def list_artifacts():
             "note": "Artifacts are created automatically when agents generate visualizations."
         }
     except Exception as e:
-        logger.error(f"Error listing artifacts: {e}")
+        logger.error("Error listing artifacts: %s", e)
         return {"success": False, "error": str(e)}
 
 @app.get("/artifacts/{artifact_name}")
@@ -198,7 +267,7 @@ async def get_artifact(artifact_name: str):
             }
             
     except Exception as e:
-        logger.error(f"Error retrieving artifact '{artifact_name}': {e}")
+        logger.error("Error retrieving artifact '%s': %s", artifact_name, e)
         return {"success": False, "error": str(e)}
 
 @app.post("/api/generate-chart")
@@ -207,73 +276,82 @@ async def generate_chart(request: Request):
     Dedicated chart generation endpoint using proven chart generation logic
     """
     try:
-        import json
-        import numpy as np
-        import matplotlib.pyplot as plt
-        from datetime import datetime
-        import re
-        
-        chart_request = await request.json()
+        chart_request = orjson.loads(await request.body())
         
-        # Generate chart using the proven logic from simple_chart_server.py
-        chart_data = chart_request.get("data", {})
         title = chart_request.get("title", "Financial Analysis")
-        chart_type = chart_request.get("chart_type", "line_projection")
-        
-        plt.ioff()
-        fig = plt.figure(figsize=(12, 8))
-        plt.clf()
-        
-        # Simple chart creation based on type
-        if chart_type == "line_projection":
-            years = chart_data.get("years", [2024, 2025, 2026, 2027, 2028])
-            values = chart_data.get("values", [1000, 1200, 1400, 1600, 1800])
-            plt.plot(years, values, marker='o', linewidth=3, markersize=10)
-            plt.xlabel('Year', fontsize=14)
-            plt.ylabel('Value ($)', fontsize=14)
-        elif chart_type == "spending_pie":
-            labels = chart_data.get("labels", ["Housing", "Food", "Transport", "Entertainment"])
-            sizes = chart_data.get("sizes", [40, 25, 20, 15])
-            plt.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90)
-        else:
-            # Default fallback
-            years = [2024, 2025, 2026, 2027, 2028]
-            values = [1000, 1200, 1400, 1600, 1800]
-            plt.plot(years, values, marker='o', linewidth=3, markersize=10)
-            plt.xlabel('Year', fontsize=14)
-            plt.ylabel('Value ($)', fontsize=14)
-        
-        plt.title(title, fontsize=18, fontweight='bold', pad=20)
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        
-        # Save to static directory
-        safe_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        filename = f"{safe_title}_{timestamp}.png"
-        
-        static_dir = os.path.join(os.path.dirname(__file__), "static", "images")
-        os.makedirs(static_dir, exist_ok=True)
-        filepath = os.path.join(static_dir, filename)
-        
-        plt.savefig(filepath, format='png', dpi=150, bbox_inches='tight')
-        plt.close(fig)
-        
-        image_url = f"/static/images/{filename}"
-        logger.info(f"Chart generated successfully: {image_url}")
+        image_url = await _get_chart_url(request.app, chart_request)
         
         return {"success": True, "url": image_url, "title": title}
         
     except Exception as e:
-        logger.error(f"Chart generation failed: {e}", exc_info=True)
+        logger.error("Chart generation failed: %s", e, exc_info=True)
         return {"success": False, "error": str(e)}
 
+async def _get_chart_url(app, chart_request):
+    # Identical requests produce identical charts, so the rendered file
+    # is named after the request hash and reused on later hits.
+    key = chart_key(chart_request)
+    filename = f"{key}.png"
+    # The image itself is the only memo: held in memory, or already on disk
+    available = key in _CHART_BYTES or await asyncio.to_thread(
+        os.path.exists, os.path.join(STATIC_IMAGES_DIR, filename)
+    )
+    if not available:
+        loop = asyncio.get_running_loop()
+        png_bytes = await loop.run_in_executor(
+            app.state.chart_pool, render_chart, chart_request, filename
+        )
+        logger.info("Chart generated successfully: %s", filename)
+        # The client fetches the image next, so keep it hot in memory
+        _remember_chart_bytes(key, png_bytes)
+    
+    return f"/api/charts/{key}.png"
+
+@app.get("/api/charts/{key}.png")
+async def get_chart_image(key: str, request: Request):
+    """
+    Serve a generated chart by its request hash, from memory when hot
+    """
+    if not _CHART_KEY_RE.fullmatch(key):
+        raise HTTPException(status_code=404, detail="Chart not found")
+    
+    headers = {"ETag": f'"{key}"', "Cache-Control": _CHART_CACHE_CONTROL}
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    png_bytes = _CHART_BYTES.get(key)
+    if png_bytes is not None:
+        _CHART_BYTES.move_to_end(key)
+    else:
+        filepath = os.path.join(STATIC_IMAGES_DIR, f"{key}.png")
+        try:
+            png_bytes = await asyncio.to_thread(_read_bytes, filepath)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Chart not found")
+        _remember_chart_bytes(key, png_bytes)
+    
+    return Response(content=png_bytes, media_type="image/png", headers=headers)
+
+def _etag_matches(if_none_match, etag):
+    """Weak If-None-Match comparison; accepts tag lists and '*', ignores W/ prefixes"""
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+def _remember_chart_bytes(key, png_bytes):
+    _CHART_BYTES[key] = png_bytes
+    if len(_CHART_BYTES) > _CHART_BYTES_MAXSIZE:
+        _CHART_BYTES.popitem(last=False)
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
 @app.get("/test-chart")
-async def test_chart():
+async def test_chart(request: Request):
     """Debug endpoint to test chart generation without agents"""
     try:
-        from agents.banking_agent.sub_agents.tools import render_chart_and_get_url
-        
         # Simple test data
         test_data = {
             "chart_type": "line_projection",
@@ -284,29 +362,13 @@ async def test_chart():
             }
         }
         
-        # Generate chart
-        image_url = render_chart_and_get_url(test_data, "Test Chart")
-        
-        if image_url.startswith("ERROR_"):
-            return {"error": image_url}
-        
-        # Return simple HTML
-        html = f"""
-        <html>
-        <body>
-            <h2>Test Chart</h2>
-            <img src="{image_url}" alt="Test Chart" style="max-width: 100%; height: auto;">
-            <p>Image URL: {image_url}</p>
-        </body>
-        </html>
-        """
-        
-        from fastapi.responses import HTMLResponse
-        return HTMLResponse(content=html)
+        # Generate (or reuse) the chart and let the browser fetch the PNG directly
+        image_url = await _get_chart_url(request.app, test_data)
+        return RedirectResponse(url=image_url)
         
     except Exception as e:
         return {"error": f"Chart generation failed: {str(e)}"}
 
 if __name__ == "__main__":
-    logger.info("Starting ADK Backend Server...")
-    uvicorn.run(app, host="0.0.0.0", port=8881)
+    # Launching from here would import this module twice; see serve.py
+    raise SystemExit("Start the server with: python serve.py")
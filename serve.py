@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Start the ADK backend server: python serve.py
+
+main.py is only ever imported by name here, never run as __main__, so a
+single process never imports it twice (once as __main__, again for
+"main:app"). Spawned processes (uvicorn workers, the chart pool) re-import
+this module as __mp_main__, so it must not import main itself.
+"""
+
+import uvicorn
+from settings import WEB_CONCURRENCY
+
+if __name__ == "__main__":
+    print("Starting ADK Backend Server...")
+    # loop/http are left at "auto": uvloop and httptools are used when
+    # installed (uvloop isn't on Windows) and asyncio/h11 otherwise
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8881,
+        workers=WEB_CONCURRENCY,
+    )
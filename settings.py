@@ -0,0 +1,20 @@
+"""
+Server settings read from the environment.
+
+Shared by main.py and the serve.py launcher; kept free of heavy imports,
+since the launcher is re-imported by every spawned worker process.
+"""
+
+import os
+
+# Sessions and artifacts default to each process's memory. Point them at
+# shared backends so every uvicorn worker sees the same state:
+#   SESSION_DB_URL       - SQLAlchemy URL for ADK's DatabaseSessionService
+#   ARTIFACT_GCS_BUCKET  - GCS bucket for ADK's GcsArtifactService
+SESSION_DB_URL = os.getenv("SESSION_DB_URL")
+ARTIFACT_GCS_BUCKET = os.getenv("ARTIFACT_GCS_BUCKET")
+
+# Number of uvicorn worker processes. With in-memory state each worker would
+# see different sessions, so only scale out by default once state is shared.
+_default_workers = (os.cpu_count() or 1) * 2 + 1 if SESSION_DB_URL and ARTIFACT_GCS_BUCKET else 1
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", _default_workers))
@@ -4,21 +4,127 @@ Simple chart generation server for prototype
 No agents, no complexity - just chart generation and serving
 """
 
-import matplotlib
-matplotlib.use('Agg')  # Must be before pyplot import
-
-import matplotlib.pyplot as plt
+import base64
+import functools
+import hashlib
+import html
 import json
 import os
-from datetime import datetime
-import re
-from fastapi import FastAPI
+import orjson
+from contextlib import asynccontextmanager
+from email.utils import formatdate, mktime_tz, parsedate_tz
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import Response
 import uvicorn
 
-app = FastAPI()
+# Both /chart and /chat show the same plot, so it is rendered once at startup
+DEFAULT_CHART_TITLE = "Financial Projection"
+DEFAULT_CHART_URL = None
+
+_CHART_HTML_TEMPLATE = """
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>Chart Display</title>
+            <style>
+                body {{ font-family: Arial, sans-serif; margin: 40px; }}
+                .chart-container {{ text-align: center; }}
+                img {{ max-width: 100%; height: auto; border: 1px solid #ddd; border-radius: 8px; }}
+            </style>
+        </head>
+        <body>
+            <div class="chart-container">
+                <h2>Generated Chart</h2>
+                <img src="{image_url}" alt="Financial Chart">
+                <p>Image URL: {image_url}</p>
+            </div>
+        </body>
+        </html>
+        """
+
+_CHAT_HTML_TEMPLATE = '''
+            <div class="chart-container">
+                <h3>Your Financial Analysis</h3>
+                <img src="{image_url}" alt="Financial Chart" style="max-width: 100%; height: auto;">
+            </div>
+            '''
+
+# HTML bodies are kept pre-encoded and sent as-is with an explicit charset
+HTML_MEDIA_TYPE = "text/html; charset=utf-8"
+
+# Filled in once at startup from the default chart
+CHART_HTML = None
+CHAT_JSON = None
+TEST_STATIC_HTML = None
+CHART_HTML_VALIDATORS = None
+TEST_STATIC_VALIDATORS = None
+
+# Charts and the /chart page are built from this file alone, so its mtime is
+# their Last-Modified; it is the same in every worker process.
+_SOURCE_MTIME = os.path.getmtime(__file__)
+
+def _validators(body, mtime):
+    """ETag (content hash) and Last-Modified headers for a body derived from a file with this mtime"""
+    # Weak, since GZipMiddleware may send the same body under another encoding
+    return {
+        "ETag": f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+        "Last-Modified": formatdate(mtime, usegmt=True),
+    }
+
+def _not_modified(request, validators):
+    """Whether the client's conditional headers show it already has this body"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence; compare weakly, ignoring W/ prefixes
+        etag = validators["ETag"].removeprefix("W/")
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        since = parsedate_tz(if_modified_since)
+        if since is None:
+            return False
+        return mktime_tz(parsedate_tz(validators["Last-Modified"])) <= mktime_tz(since)
+    return False
+
+def _cached_response(request, body, media_type, validators, headers=None):
+    """Send a cached body, or an empty 304 if the client already has it"""
+    headers = {**validators, **(headers or {})}
+    if _not_modified(request, validators):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+def _chart_page(image_url):
+    """Format the /chart page for an image URL as encoded HTML"""
+    return _CHART_HTML_TEMPLATE.format(image_url=image_url).encode()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global DEFAULT_CHART_URL, CHART_HTML, CHAT_JSON, TEST_STATIC_HTML
+    global CHART_HTML_VALIDATORS, TEST_STATIC_VALIDATORS
+    DEFAULT_CHART_URL = create_simple_chart(DEFAULT_CHART_TITLE)
+    CHART_HTML = _chart_page(DEFAULT_CHART_URL)
+    CHART_HTML_VALIDATORS = _validators(CHART_HTML, _SOURCE_MTIME)
+    # The /chat reply never changes, so it is serialized once here
+    CHAT_JSON = orjson.dumps({
+        "content": "Here's your financial analysis chart:",
+        "hasVisualization": True,
+        "visualizationHtml": _CHAT_HTML_TEMPLATE.format(image_url=DEFAULT_CHART_URL)
+    })
+    # The test page never changes while the server runs, so read it once
+    try:
+        with open("test_static.html", "rb") as f:
+            TEST_STATIC_HTML = f.read()
+            TEST_STATIC_VALIDATORS = _validators(TEST_STATIC_HTML, os.fstat(f.fileno()).st_mtime)
+    except FileNotFoundError:
+        pass
+    yield
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS for frontend
 origins = ["http://localhost:3000"]
@@ -30,78 +136,128 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# The HTML and JSON bodies are small but very compressible; tiny ones aren't worth it
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # Static file serving
 static_dir = "static/images"
 os.makedirs(static_dir, exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-def create_simple_chart(title="Sample Chart"):
-    """Create a simple test chart"""
-    plt.ioff()
-    fig = plt.figure(figsize=(10, 6))
-    plt.clf()
+# Images under /static/images are never rewritten in place, so browsers can
+# keep them; the HTML pages embed fresh chart URLs and must be revalidated.
+_NO_CACHE_PATHS = ("/", "/chart")
+
+@app.middleware("http")
+async def cache_headers(request, call_next):
+    response = await call_next(request)
+    path = request.url.path
+    if path.startswith("/static/images/"):
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    elif path in _NO_CACHE_PATHS:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# The chart is a fixed five-point line, so it is drawn as a hand-written SVG
+# instead of going through matplotlib: no rasterizing or PNG encoding, and
+# browsers scale it cleanly at any size.
+_YEARS = (2024, 2025, 2026, 2027, 2028)
+_VALUES = (1000, 1200, 1400, 1600, 1800)
+
+# Plot area inside a 1000x600 viewBox (the old 10x6 inch aspect ratio)
+_LEFT, _RIGHT, _TOP, _BOTTOM = 110, 960, 80, 520
+
+def _scale(v, lo, hi, out_lo, out_hi):
+    return out_lo + (v - lo) * (out_hi - out_lo) / (hi - lo)
+
+def _build_svg_template():
+    """Lay out the fixed chart once; only {title} is filled in per render"""
+    x_lo, x_hi = _YEARS[0] - 0.2, _YEARS[-1] + 0.2
+    y_lo, y_hi = _VALUES[0] - 40, _VALUES[-1] + 40
+    xs = [_scale(x, x_lo, x_hi, _LEFT, _RIGHT) for x in _YEARS]
+    ys = [_scale(y, y_lo, y_hi, _BOTTOM, _TOP) for y in _VALUES]
     
-    # Simple data
-    years = [2024, 2025, 2026, 2027, 2028]
-    values = [1000, 1200, 1400, 1600, 1800]
+    parts = [
+        '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 1000 600" width="1000" height="600" '
+        'font-family="DejaVu Sans, Arial, sans-serif">',
+        '<rect width="1000" height="600" fill="#fff"/>',
+        f'<text x="{(_LEFT + _RIGHT) / 2:.1f}" y="50" text-anchor="middle" font-size="26" '
+        'font-weight="bold">{title}</text>',
+    ]
+    # Grid lines and tick labels, one per data point on each axis
+    for year, x in zip(_YEARS, xs):
+        parts.append(f'<line x1="{x:.1f}" y1="{_TOP}" x2="{x:.1f}" y2="{_BOTTOM}" stroke="#b0b0b0" stroke-opacity="0.3"/>')
+        parts.append(f'<text x="{x:.1f}" y="{_BOTTOM + 28}" text-anchor="middle" font-size="16">{year}</text>')
+    for value, y in zip(_VALUES, ys):
+        parts.append(f'<line x1="{_LEFT}" y1="{y:.1f}" x2="{_RIGHT}" y2="{y:.1f}" stroke="#b0b0b0" stroke-opacity="0.3"/>')
+        parts.append(f'<text x="{_LEFT - 10}" y="{y + 6:.1f}" text-anchor="end" font-size="16">{value}</text>')
+    parts.append(f'<rect x="{_LEFT}" y="{_TOP}" width="{_RIGHT - _LEFT}" height="{_BOTTOM - _TOP}" fill="none" stroke="#000"/>')
     
-    plt.plot(years, values, marker='o', linewidth=2, markersize=8)
-    plt.title(title, fontsize=16, fontweight='bold')
-    plt.xlabel('Year')
-    plt.ylabel('Value ($)')
-    plt.grid(True, alpha=0.3)
+    points = " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(xs, ys))
+    parts.append(f'<polyline points="{points}" fill="none" stroke="#1f77b4" stroke-width="3"/>')
+    parts.extend(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="6" fill="#1f77b4"/>' for x, y in zip(xs, ys))
     
-    # Save to file
-    safe_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    filename = f"{safe_title}_{timestamp}.png"
-    filepath = os.path.join(static_dir, filename)
+    parts.append(f'<text x="{(_LEFT + _RIGHT) / 2:.1f}" y="{_BOTTOM + 62}" text-anchor="middle" font-size="18">Year</text>')
+    parts.append(f'<text transform="translate(30 {(_TOP + _BOTTOM) / 2:.1f}) rotate(-90)" text-anchor="middle" '
+                 'font-size="18">Value ($)</text>')
+    parts.append('</svg>')
+    return "\n".join(parts)
+
+_SVG_TEMPLATE = _build_svg_template()
+
+def create_simple_chart(title="Sample Chart"):
+    """Create a simple test chart"""
+    image_url, _, _ = _render_chart(title)
+    return image_url
+
+@functools.lru_cache(maxsize=32)
+def _render_chart(title):
+    """Render the chart for a title once; returns (image_url, svg_bytes, validators)"""
+    # The title may come from a query string, so escape it before it goes into markup
+    svg_bytes = _SVG_TEMPLATE.replace("{title}", html.escape(title)).encode()
     
-    plt.savefig(filepath, format='png', dpi=150, bbox_inches='tight')
-    plt.close(fig)
+    # The key is the title itself (URL-safe base64), so whichever worker
+    # process receives the image request can render it, not just the one
+    # that served the page
+    key = base64.urlsafe_b64encode(title.encode()).rstrip(b"=").decode()
     
-    return f"/static/images/{filename}"
+    return f"/chart.svg/{key}", svg_bytes, _validators(svg_bytes, _SOURCE_MTIME)
+
+@app.get("/chart.svg/{key}")
+async def chart_svg(key: str, request: Request):
+    """Serve a rendered chart, from this worker's cache when possible"""
+    try:
+        title = base64.b64decode(key + "=" * (-len(key) % 4), altchars=b"-_", validate=True).decode()
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Chart not found")
+    _, svg_bytes, validators = _render_chart(title)
+    # A key is only ever bound to one image, so browsers can keep it forever
+    return _cached_response(
+        request,
+        svg_bytes,
+        "image/svg+xml",
+        validators,
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
 
 @app.get("/")
 async def root():
     return {"message": "Simple Chart Server Running"}
 
 @app.get("/test_static.html")
-async def test_static():
+async def test_static(request: Request):
     """Serve the test static HTML page"""
-    with open("test_static.html", "r") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content)
+    if TEST_STATIC_HTML is None:
+        raise HTTPException(status_code=404, detail="test_static.html not found")
+    return _cached_response(request, TEST_STATIC_HTML, HTML_MEDIA_TYPE, TEST_STATIC_VALIDATORS)
 
 @app.get("/chart")
-async def generate_chart():
-    """Generate a simple chart and return HTML with the image"""
+async def generate_chart(request: Request, title: Optional[str] = None):
+    """Return HTML with the chart image; pass ?title= to render a custom one"""
     try:
-        image_url = create_simple_chart("Financial Projection")
-        
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Chart Display</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 40px; }}
-                .chart-container {{ text-align: center; }}
-                img {{ max-width: 100%; height: auto; border: 1px solid #ddd; border-radius: 8px; }}
-            </style>
-        </head>
-        <body>
-            <div class="chart-container">
-                <h2>Generated Chart</h2>
-                <img src="{image_url}" alt="Financial Chart">
-                <p>Image URL: {image_url}</p>
-                <p>Generated at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return HTMLResponse(content=html)
+        if title:
+            return Response(content=_chart_page(create_simple_chart(title)), media_type=HTML_MEDIA_TYPE)
+        return _cached_response(request, CHART_HTML, HTML_MEDIA_TYPE, CHART_HTML_VALIDATORS)
         
     except Exception as e:
         return {"error": f"Chart generation failed: {str(e)}"}
@@ -109,25 +265,16 @@ async def generate_chart():
 @app.post("/chat")
 async def simple_chat():
     """Simple endpoint that returns a chart for any message"""
-    try:
-        image_url = create_simple_chart("Your Financial Analysis")
-        
-        response = {
-            "content": "Here's your financial analysis chart:",
-            "hasVisualization": True,
-            "visualizationHtml": f'''
-            <div class="chart-container">
-                <h3>Your Financial Analysis</h3>
-                <img src="{image_url}" alt="Financial Chart" style="max-width: 100%; height: auto;">
-            </div>
-            '''
-        }
-        
-        return response
-        
-    except Exception as e:
-        return {"error": f"Chart generation failed: {str(e)}"}
+    return Response(content=CHAT_JSON, media_type="application/json")
 
 if __name__ == "__main__":
     print("Starting Simple Chart Server on http://localhost:8881")
-    uvicorn.run(app, host="0.0.0.0", port=8881)
+    # Workers share nothing, so each renders its own default chart at startup;
+    # chart URLs carry their title, so any worker can serve any image.
+    # loop/http stay "auto" so uvloop/httptools are used only where installed.
+    uvicorn.run(
+        "simple_chart_server:app",
+        host="0.0.0.0",
+        port=8881,
+        workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+    )
@@ -4,11 +4,24 @@ Simple test script to verify the artifact system is working correctly.
 Run this after starting the main server to test artifact functionality.
 """
 
-import requests
+import asyncio
+import httpx
 import json
+import os
 import time
 
-def test_artifact_system():
+def _write_chunks(path, chunks):
+    """Write byte chunks to path through a raw fd, with no text-layer buffering"""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        for chunk in chunks:
+            view = memoryview(chunk)
+            while view:
+                view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+async def run_artifact_checks():
     """Test the artifact generation and retrieval system"""
     
     base_url = "http://localhost:8881"
@@ -16,10 +29,18 @@ def test_artifact_system():
     print("🧪 Testing ADK Artifact System")
     print("=" * 50)
     
+    # One client so every request reuses the same pooled keep-alive connections;
+    # no timeout, since an agent run can take a while
+    client = httpx.AsyncClient(base_url=base_url, timeout=None)
     try:
+        # Tests 1 and 2 don't depend on each other, so probe both at once
+        response, list_response = await asyncio.gather(
+            client.get("/"),
+            client.get("/artifacts/list"),
+        )
+        
         # Test 1: Check if server is running
         print("1. Checking server status...")
-        response = requests.get(f"{base_url}/")
         if response.status_code == 200:
             print("✅ Server is running")
             print(f"   Response: {response.json()}")
@@ -31,10 +52,9 @@ def test_artifact_system():
         
         # Test 2: Test artifact system status
         print("2. Testing artifact system...")
-        response = requests.get(f"{base_url}/artifacts/list")
         
-        if response.status_code == 200:
-            result = response.json()
+        if list_response.status_code == 200:
+            result = list_response.json()
             print("✅ Artifact system is ready")
             print(f"   Status: {result.get('message')}")
             
@@ -50,13 +70,14 @@ def test_artifact_system():
                 }
             }
             
-            run_response = requests.post(
-                f"{base_url}/apps/banking_agent/users/test_user/sessions/test_session:run",
+            run_response = await client.post(
+                "/apps/banking_agent/users/test_user/sessions/test_session:run",
                 json=agent_request
             )
             
             if run_response.status_code == 200:
-                events = run_response.json()
+                # The run endpoint streams one JSON event per line (NDJSON)
+                events = [json.loads(line) for line in run_response.text.splitlines() if line]
                 print("✅ Agent interaction completed")
                 print(f"   Received {len(events)} events")
                 
@@ -69,7 +90,8 @@ def test_artifact_system():
                 # Test 4: Try to retrieve any artifacts
                 print("4. Testing artifact retrieval...")
                 if artifact_name:
-                    response = requests.get(f"{base_url}/artifacts/{artifact_name}")
+                    # Only after the run has finished can its artifact exist
+                    response = await client.get(f"/artifacts/{artifact_name}")
                     
                     if response.status_code == 200:
                         result = response.json()
@@ -78,8 +100,10 @@ def test_artifact_system():
                             print(f"   MIME type: {result.get('mime_type')}")
                             print(f"   Data URL length: {len(result.get('data_url', ''))}")
                             
-                            # Save a small HTML file to view the image
-                            html_content = f"""
+                            # Save a small HTML file to view the image. The data URL can be
+                            # megabytes of base64, so it is written between the encoded page
+                            # halves instead of being formatted into one big string.
+                            html_head = f"""
                             <!DOCTYPE html>
                             <html>
                             <head>
@@ -94,17 +118,23 @@ def test_artifact_system():
                                 <div class="container">
                                     <h1>🎉 ADK Artifact System Test - SUCCESS!</h1>
                                     <h2>Generated Chart Artifact: {artifact_name}</h2>
-                                    <img src="{result.get('data_url')}" alt="Generated Chart" />
+                                    <img src=""".encode()
+                            html_tail = f""" alt="Generated Chart" />
                                     <p><strong>Artifact Name:</strong> {artifact_name}</p>
                                     <p><strong>MIME Type:</strong> {result.get('mime_type')}</p>
                                     <p><strong>Status:</strong> ✅ Artifact generation and retrieval working!</p>
                                 </div>
                             </body>
                             </html>
-                            """
+                            """.encode()
                             
-                            with open('artifact_test_result.html', 'w') as f:
-                                f.write(html_content)
+                            _write_chunks('artifact_test_result.html', (
+                                html_head,
+                                b'"',
+                                result.get('data_url', '').encode('ascii'),
+                                b'"',
+                                html_tail,
+                            ))
                             
                             print("   📄 Created 'artifact_test_result.html' - open it to view the generated chart!")
                             
@@ -125,11 +155,13 @@ def test_artifact_system():
         print()
         print("🏁 Test completed!")
         
-    except requests.exceptions.ConnectionError:
+    except httpx.ConnectError:
         print("❌ Could not connect to server. Make sure the server is running on port 8881")
-        print("   Start it with: python main.py")
+        print("   Start it with: python serve.py")
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
+    finally:
+        await client.aclose()
 
 if __name__ == "__main__":
-    test_artifact_system()
+    asyncio.run(run_artifact_checks())